@@ -97,6 +97,23 @@ def analyze_properties():
             print(f"     {price:,.0f} PLN • {area}m² • {location} • {portal}")
             print(f"     {url}\n")
         
+        # TOP 10 niedowartościowanych względem segmentu (valuation.py)
+        cursor.execute('''
+            SELECT title, price, area, price_per_m2, score, portal, url
+            FROM properties 
+            WHERE is_active = 1 AND score IS NOT NULL
+            ORDER BY score ASC
+            LIMIT 10
+        ''')
+        
+        bargains = cursor.fetchall()
+        if bargains:
+            print(f"\n🔥 TOP 10 - NAJBARDZIEJ NIEDOWARTOŚCIOWANE (względem segmentu)\n")
+            for i, (title, price, area, ppm2, score, portal, url) in enumerate(bargains, 1):
+                print(f"  {i}. {score:+.1f}σ • {ppm2:,.0f} PLN/m² - {title[:50]}...")
+                print(f"     {price:,.0f} PLN • {area}m² • {portal}")
+                print(f"     {url}\n")
+        
         # Najnowsze oferty (ostatnie 24h)
         yesterday = datetime.now() - timedelta(days=1)
         cursor.execute('''
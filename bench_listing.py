@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark pamięci: ile bajtów zajmuje jedna oferta jako dict, Listing i ListingBatch
+"""
+
+import sys
+import time
+import tracemalloc
+
+from listing import Listing, ListingBatch, Portal, DEFAULT_LOCATION
+
+N = 100_000
+
+
+def sample(i):
+    # Tytuł i URL budowane dynamicznie - tak jak po parsowaniu HTML
+    return (f"Mieszkanie 2-pokojowe, oferta {i}", 350000.0 + i, 40.0 + i % 50,
+            f"https://www.otodom.pl/pl/oferta/mieszkanie-{i}")
+
+
+def build_dicts():
+    out = []
+    for i in range(N):
+        title, price, area, url = sample(i)
+        out.append({
+            'portal': 'otodom', 'title': title,
+            'price': price, 'area': area,
+            'price_per_m2': round(price/area, 2) if area > 0 else 0,
+            'location': 'Wrocław',
+            'url': url
+        })
+    return out
+
+
+def build_listings():
+    out = []
+    for i in range(N):
+        title, price, area, url = sample(i)
+        out.append(Listing(Portal.OTODOM, title, price, area, url, DEFAULT_LOCATION))
+    return out
+
+
+def build_batch():
+    batch = ListingBatch()
+    for i in range(N):
+        title, price, area, url = sample(i)
+        batch.append(Listing(Portal.OTODOM, title, price, area, url, DEFAULT_LOCATION))
+    return batch
+
+
+def measure(name, builder, baseline=None):
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = builder()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_item = current / N
+    line = f"  {name:<14} {per_item:>8.1f} B/oferta   szczyt {peak / 1024 / 1024:>7.1f} MiB   {elapsed:>6.2f} s"
+    if baseline:
+        line += f"   ({per_item / baseline:.0%} względem dict)"
+    print(line)
+    del data
+    return per_item
+
+
+if __name__ == '__main__':
+    print(f"\n📏 PAMIĘĆ NA OFERTĘ (N = {N:,}, Python {sys.version.split()[0]})\n")
+    base = measure("dict", build_dicts)
+    measure("Listing", build_listings, base)
+    measure("ListingBatch", build_batch, base)
+    print()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Import historycznych ofert z plików JSONL / CSV (także .gz i eksportów z analyze.py)
+
+Użycie: python bulk_import.py plik1.jsonl plik2.csv archive/properties_2026-01.*.jsonl.gz
+"""
+
+import os
+import csv
+import gzip
+import json
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from listing import Listing
+import geo
+
+CHUNK_ROWS = 50_000
+DB_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Formaty dat po ręcznej edycji CSV (np. w Excelu); ISO-8601 i format bazy obsługuje fromisoformat
+CSV_TIME_FORMATS = ('%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y')
+
+# Nagłówki eksportu analyze.export_to_csv -> pola Listing
+CSV_HEADERS = {
+    'Portal': 'portal', 'Tytuł': 'title', 'Cena': 'price', 'Metraż': 'area',
+    'Cena za m²': 'price_per_m2', 'Lokalizacja': 'location', 'URL': 'url',
+    'Pierwsze zobaczenie': 'first_seen', 'Ostatnie zobaczenie': 'last_seen',
+}
+
+# Przy powtórzonym URL zostaje najwcześniejsze first_seen, najpóźniejsze last_seen
+# i dane z najświeższego rekordu - dzięki temu ponowny import paczki nic nie psuje
+UPSERT_SQL = '''
+    INSERT INTO properties (portal, title, price, area, price_per_m2, location, url, first_seen, last_seen, lat, lon)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(url) DO UPDATE SET
+        lat = coalesce(excluded.lat, lat),
+        lon = coalesce(excluded.lon, lon),
+        title = CASE WHEN excluded.last_seen > last_seen THEN excluded.title ELSE title END,
+        price = CASE WHEN excluded.last_seen > last_seen THEN excluded.price ELSE price END,
+        area = CASE WHEN excluded.last_seen > last_seen THEN excluded.area ELSE area END,
+        price_per_m2 = CASE WHEN excluded.last_seen > last_seen THEN excluded.price_per_m2 ELSE price_per_m2 END,
+        first_seen = min(first_seen, excluded.first_seen),
+        last_seen = max(last_seen, excluded.last_seen)
+'''
+
+
+def _open(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Strumieniowo czyta rekordy - w pamięci jest zawsze tylko bieżąca linia"""
+    is_csv = path.endswith('.csv') or path.endswith('.csv.gz')
+    with _open(path) as f:
+        if is_csv:
+            reader = csv.reader(f)
+            header = [CSV_HEADERS.get(h, h) for h in next(reader, [])]
+            for values in reader:
+                yield dict(zip(header, values))
+        else:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield {}  # pusta/uszkodzona linia - liczy się do postępu, normalize ją odrzuci
+
+
+def parse_timestamp(value) -> Optional[str]:
+    """
+    Czas z rekordu -> format bazy (czas lokalny, jak datetime.now() w monitorze).
+    Przyjmuje epokę w sekundach lub milisekundach (liczba albo napis), ISO-8601
+    (także ze strefą, np. 'Z') i format eksportu CSV. None - wartość nie do odczytania.
+    """
+    if isinstance(value, bool):
+        return None
+    text = str(value).strip()
+    try:
+        epoch = float(text)
+    except ValueError:
+        epoch = None
+    try:
+        if epoch is not None:
+            dt = datetime.fromtimestamp(epoch / 1000 if epoch > 1e11 else epoch)
+        else:
+            try:
+                dt = datetime.fromisoformat(text)
+            except ValueError:
+                for fmt in CSV_TIME_FORMATS:
+                    try:
+                        dt = datetime.strptime(text, fmt)
+                        break
+                    except ValueError:
+                        continue
+                else:
+                    return None
+            if dt.tzinfo is not None:
+                dt = dt.astimezone().replace(tzinfo=None)
+    except (OverflowError, OSError, ValueError):
+        return None
+    if dt.year < 2000:
+        return None  # np. cena albo id w złej kolumnie, nie data oferty
+    return dt.strftime(DB_TIME_FORMAT)
+
+
+def normalize(record: Dict, now: str) -> Optional[Tuple]:
+    """Rekord -> krotka dla UPSERT_SQL przez model Listing; None dla rekordów błędnych"""
+    if not isinstance(record, dict):
+        return None
+    url = record.get('url')
+    if not url or not record.get('portal'):
+        return None
+    # Puste wartości z CSV ('') zamieniamy na brak, resztę waliduje i konwertuje Listing
+    fields = {'portal': str(record['portal']).strip().lower(), 'title': record.get('title') or '',
+              'price': record.get('price'), 'area': record.get('area'), 'url': url,
+              'location': record.get('location'), 'lat': record.get('lat') or None, 'lon': record.get('lon') or None}
+    try:
+        listing = Listing.from_dict(fields)
+    except (TypeError, ValueError):
+        return None
+    if listing.price <= 0:
+        return None
+    # Data nie do odczytania - rekord odrzucony; brak obu dat - czas importu
+    seen = {}
+    for key in ('first_seen', 'last_seen'):
+        if record.get(key):
+            seen[key] = parse_timestamp(record[key])
+            if seen[key] is None:
+                return None
+    first_seen = seen.get('first_seen') or seen.get('last_seen') or now
+    last_seen = seen.get('last_seen') or first_seen
+    return (listing.portal, listing.title, listing.price, listing.area, listing.price_per_m2,
+            listing.location, listing.url, first_seen, max(first_seen, last_seen),
+            listing.lat, listing.lon)
+
+
+class BulkImporter:
+    """
+    Import w dużych transakcjach z luźniejszymi pragmami. Postęp każdego pliku
+    zapisywany jest w tej samej transakcji co dane, więc po przerwaniu import
+    wznawia się od ostatniej zatwierdzonej paczki. Monitor powinien być na ten
+    czas zatrzymany - odbudowa indeksów trzyma blokadę zapisu dłużej niż jego timeout.
+    """
+
+    def __init__(self, db_path: str = 'properties.db', chunk_rows: int = CHUNK_ROWS):
+        self.db_path = db_path
+        self.chunk_rows = chunk_rows
+        # Zwykły tryb blokad: między paczkami baza jest dostępna dla innych połączeń
+        self.conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        # synchronous=OFF jest bezpieczne przy przerwaniu procesu (dziennik zostaje),
+        # ryzyko dotyczy tylko awarii zasilania/systemu w trakcie importu
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+        self.conn.execute('PRAGMA cache_size = -65536')  # 64 MiB - mieści się w limicie kontenera
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS import_progress (
+                                 path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                                 rows INTEGER, done INTEGER DEFAULT 0)''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS import_indexes (name TEXT PRIMARY KEY, sql TEXT)')
+
+    def drop_indexes(self):
+        """
+        Usuwa indeksy pomocnicze i triggery R*Tree na czas importu
+        (UNIQUE(url) zostaje - potrzebny do UPSERT)
+        """
+        self.conn.execute('BEGIN')
+        self.conn.execute('''INSERT OR IGNORE INTO import_indexes (name, sql)
+                             SELECT name, sql FROM sqlite_master
+                             WHERE type IN ('index', 'trigger') AND tbl_name = 'properties' AND sql IS NOT NULL''')
+        for (name,) in self.conn.execute('SELECT name FROM import_indexes').fetchall():
+            self.conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+            self.conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+        self.conn.execute('COMMIT')
+
+    def restore_indexes(self):
+        self.conn.execute('BEGIN')
+        for name, sql in self.conn.execute('SELECT name, sql FROM import_indexes').fetchall():
+            prefix = 'CREATE INDEX' if sql.startswith('CREATE INDEX') else 'CREATE TRIGGER'
+            self.conn.execute(sql.replace(prefix, f'{prefix} IF NOT EXISTS', 1))
+        self.conn.execute('DELETE FROM import_indexes')
+        # Triggery nie działały w trakcie importu - R*Tree budujemy od nowa jednym INSERT ... SELECT
+        geo.rebuild_index(self.conn)
+        self.conn.execute('COMMIT')
+
+    def _progress(self, path: str) -> int:
+        """Ile rekordów pliku jest już zaimportowanych (0 - plik nowy lub zmieniony)"""
+        st = os.stat(path)
+        row = self.conn.execute('SELECT size, mtime, rows, done FROM import_progress WHERE path = ?',
+                                (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return -1 if row[3] else row[2]
+        self.conn.execute('INSERT OR REPLACE INTO import_progress (path, size, mtime, rows, done) VALUES (?,?,?,0,0)',
+                          (path, st.st_size, st.st_mtime))
+        return 0
+
+    def import_file(self, path: str) -> Tuple[int, int]:
+        """Zwraca (zaimportowane, odrzucone)"""
+        path = os.path.abspath(path)
+        skip = self._progress(path)
+        if skip < 0:
+            print(f"  ⊘ {path}: już zaimportowany", flush=True)
+            return 0, 0
+
+        now = datetime.now().strftime(DB_TIME_FORMAT)
+        consumed, imported, rejected = 0, 0, 0
+        chunk = []
+
+        def flush():
+            self.conn.execute('BEGIN')
+            self.conn.executemany(UPSERT_SQL, chunk)
+            self.conn.execute('UPDATE import_progress SET rows = ? WHERE path = ?', (consumed, path))
+            self.conn.execute('COMMIT')
+            chunk.clear()
+
+        for record in read_records(path):
+            consumed += 1
+            if consumed <= skip:
+                continue
+            row = normalize(record, now)
+            if row is None:
+                rejected += 1
+                continue
+            chunk.append(row)
+            imported += 1
+            if len(chunk) >= self.chunk_rows:
+                flush()
+
+        if chunk:
+            flush()
+        self.conn.execute('UPDATE import_progress SET rows = ?, done = 1 WHERE path = ?', (consumed, path))
+        return imported, rejected
+
+    def run(self, paths) -> int:
+        self.drop_indexes()
+        total = 0
+        start = time.perf_counter()
+        for path in paths:
+            t = time.perf_counter()
+            imported, rejected = self.import_file(path)
+            elapsed = time.perf_counter() - t
+            total += imported
+            if imported or rejected:
+                print(f"  ✓ {path}: {imported:,} ofert, {rejected:,} odrzuconych "
+                      f"({imported / max(elapsed, 1e-9):,.0f} wierszy/s)", flush=True)
+        # Po przerwaniu indeksy odtworzy następne uruchomienie (lista zostaje w import_indexes)
+        print("  🔧 Odbudowa indeksów...", flush=True)
+        self.restore_indexes()
+        print(f"\n✓ Razem: {total:,} ofert w {time.perf_counter() - start:.1f} s", flush=True)
+        return total
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        sys.exit(1)
+
+    from real_estate_monitor import RealEstateMonitor
+    RealEstateMonitor()  # tworzy/migruje schemat bazy
+
+    print("📥 IMPORT HISTORII\n")
+    BulkImporter().run(sys.argv[1:])
+    print("ℹ️  Aby wycenić zaimportowane oferty uruchom: python valuation.py --rebuild")
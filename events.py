@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Kanał Server-Sent Events: jeden wątek rozsyła zmiany do wszystkich otwartych kart
+"""
+
+import json
+import queue
+import socket
+import selectors
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MAX_EVENT_BYTES = 64 * 1024   # listy dłuższe niż to dzielimy na kilka zdarzeń
+MAX_PENDING = 1024 * 1024     # ile niewysłanych bajtów może czekać na jednego klienta
+RELOAD = b"event: reload\ndata: {}\n\n"
+
+
+def _chunks(data) -> Iterator:
+    """Dzieli listę na kawałki o rozmiarze JSON do MAX_EVENT_BYTES; inne dane bez zmian"""
+    if not isinstance(data, list):
+        yield data
+        return
+    chunk, size = [], 0
+    for item in data:
+        item_size = len(json.dumps(item, ensure_ascii=False).encode('utf-8')) + 1
+        if chunk and size + item_size > MAX_EVENT_BYTES:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        yield chunk
+
+
+class EventBroadcaster:
+    """
+    Trzyma gniazda subskrybentów /events i rozsyła do nich zdarzenia z jednego
+    wątku. Gniazda są nieblokujące, a każdy klient ma własny bufor: to, czego
+    gniazdo nie przyjęło od razu, jest dosyłane, gdy select zgłosi gotowość do
+    zapisu. Klient, któremu zaległości przekroczą MAX_PENDING, jest rozłączany,
+    a po ponownym połączeniu (EventSource robi to sam) dostaje brakujące
+    zdarzenia z historii na podstawie nagłówka Last-Event-ID - albo polecenie
+    przeładowania strony, jeśli zaległości nie mieszczą się w buforze.
+    """
+
+    def __init__(self, history: int = 256, heartbeat: float = 15):
+        self._events = queue.Queue(maxsize=1000)
+        self._history = deque(maxlen=history)
+        self._clients: Dict[socket.socket, bytearray] = {}
+        self._joining: List[Tuple[socket.socket, Optional[str]]] = []
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        # Id liczone od czasu startu w ms - po restarcie są większe niż wszystkie poprzednie,
+        # więc klient ze starym Last-Event-ID trafia w kontrolę zaległości zamiast w pustą historię
+        self._next_id = int(time.time() * 1000)
+        self._heartbeat = heartbeat
+        self._started = False
+
+    def start(self):
+        self._started = True
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except BlockingIOError:
+            pass  # bufor pełny - wątek i tak zostanie obudzony
+
+    def publish(self, event: str, data):
+        if not self._started:
+            return  # bez serwera (np. import historii) nie ma komu wysyłać
+        try:
+            self._events.put_nowait((event, data))
+        except queue.Full:
+            print("❌ SSE: kolejka zdarzeń pełna, pomijam zdarzenie", flush=True)
+            return
+        self._wake()
+
+    def subscribe(self, sock: socket.socket, last_event_id: Optional[str] = None):
+        """Przejmuje gniazdo po wysłaniu nagłówków odpowiedzi; resztą zajmuje się wątek rozgłaszający"""
+        sock.setblocking(False)
+        with self._lock:
+            self._joining.append((sock, last_event_id))
+        self._wake()
+
+    def owns(self, sock: socket.socket) -> bool:
+        with self._lock:
+            return sock in self._clients or any(s is sock for s, _ in self._joining)
+
+    @property
+    def last_id(self) -> int:
+        """Id ostatniego rozesłanego zdarzenia"""
+        return self._next_id - 1
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._clients)
+
+    def _close(self, sock: socket.socket):
+        with self._lock:
+            self._clients.pop(sock, None)
+        if sock in self._selector.get_map():
+            self._selector.unregister(sock)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _flush(self, sock: socket.socket):
+        """Wysyła z bufora tyle, ile gniazdo przyjmie. W selektorze są tylko gniazda z zaległościami."""
+        pending = self._clients.get(sock)
+        if pending is None:
+            return
+        waiting = sock in self._selector.get_map()
+        try:
+            while pending:
+                del pending[:sock.send(pending)]
+        except BlockingIOError:
+            pass
+        except OSError:
+            return self._close(sock)
+        if pending and not waiting:
+            self._selector.register(sock, selectors.EVENT_WRITE)
+        elif waiting and not pending:
+            self._selector.unregister(sock)
+
+    def _send(self, sock: socket.socket, payload: bytes):
+        pending = self._clients.get(sock)
+        if pending is None:
+            return
+        if len(pending) + len(payload) > MAX_PENDING:
+            # Klient nie nadąża - rozłączamy, po powrocie dostanie zaległości z historii
+            return self._close(sock)
+        pending += payload
+        if len(pending) == len(payload):
+            self._flush(sock)  # przy starszych zaległościach wyśle je _flush, gdy gniazdo będzie gotowe
+
+    def _accept(self):
+        with self._lock:
+            joining, self._joining = self._joining, []
+        for sock, last_event_id in joining:
+            missed = b''
+            if last_event_id and last_event_id.isdigit():
+                last = int(last_event_id)
+                oldest = self._history[0][0] if self._history else self._next_id
+                missed = b''.join(msg for eid, msg in self._history if eid > last)
+                if last < oldest - 1 or last >= self._next_id:
+                    # Część zaległości wypadła z historii albo id pochodzi z innego procesu
+                    missed = RELOAD
+            if len(missed) > MAX_PENDING:
+                # Zaległości większe niż bufor - zamiast pętli rozłącz/powtórz przeładowujemy stronę
+                missed = RELOAD
+            with self._lock:
+                self._clients[sock] = bytearray()
+            if missed:
+                self._send(sock, missed)
+
+    def _broadcast(self, payload: bytes):
+        for sock in list(self._clients):
+            self._send(sock, payload)
+
+    def _run(self):
+        last_beat = time.monotonic()
+        while True:
+            timeout = max(0, last_beat + self._heartbeat - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._flush(key.fileobj)
+
+            self._accept()
+
+            while True:
+                try:
+                    event, data = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                for chunk in _chunks(data):
+                    eid = self._next_id
+                    self._next_id += 1
+                    body = json.dumps(chunk, ensure_ascii=False)
+                    msg = f"id: {eid}\nevent: {event}\ndata: {body}\n\n".encode('utf-8')
+                    self._history.append((eid, msg))
+                    self._broadcast(msg)
+
+            if time.monotonic() - last_beat >= self._heartbeat:
+                # Komentarz SSE - utrzymuje połączenie i wykrywa martwych klientów
+                self._broadcast(b": ping\n\n")
+                last_beat = time.monotonic()
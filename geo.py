@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Indeks przestrzenny ofert (SQLite R*Tree) i zapytania o okolicę / prostokąt na mapie
+"""
+
+import math
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+
+
+def init_db(conn: sqlite3.Connection):
+    """
+    Tabela R*Tree (punkt = prostokąt o zerowym rozmiarze) i triggery synchronizujące.
+    Gdy triggerów brakowało (nowa baza albo przerwany import), indeks jest odbudowywany.
+    """
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS properties_geo
+                    USING rtree(id, min_lat, max_lat, min_lon, max_lon)''')
+    triggers = conn.execute('''SELECT count(*) FROM sqlite_master
+                               WHERE type = 'trigger' AND name LIKE 'properties_geo_%' ''').fetchone()[0]
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS properties_geo_insert AFTER INSERT ON properties
+                    WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+                        INSERT OR REPLACE INTO properties_geo VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS properties_geo_update AFTER UPDATE OF lat, lon ON properties
+                    BEGIN
+                        DELETE FROM properties_geo WHERE id = old.id;
+                        INSERT INTO properties_geo SELECT new.id, new.lat, new.lat, new.lon, new.lon
+                            WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS properties_geo_delete AFTER DELETE ON properties
+                    BEGIN
+                        DELETE FROM properties_geo WHERE id = old.id;
+                    END''')
+    if triggers < 3:
+        rebuild_index(conn)
+
+
+def rebuild_index(conn: sqlite3.Connection):
+    """Odbudowa R*Tree z kolumn lat/lon (np. po imporcie z wyłączonymi triggerami)"""
+    conn.execute('DELETE FROM properties_geo')
+    conn.execute('''INSERT INTO properties_geo
+                    SELECT id, lat, lat, lon, lon FROM properties
+                    WHERE lat IS NOT NULL AND lon IS NOT NULL''')
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bbox_around(lat: float, lon: float, km: float) -> Tuple[float, float, float, float]:
+    """Prostokąt (min_lat, min_lon, max_lat, max_lon) opisany na okręgu o promieniu km"""
+    dlat = km / KM_PER_DEG_LAT
+    dlon = km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def _filters(min_price: Optional[float], max_price: Optional[float],
+             min_area: Optional[float], max_area: Optional[float]) -> Tuple[str, list]:
+    sql, params = '', []
+    for column, op, value in (('price', '>=', min_price), ('price', '<=', max_price),
+                              ('area', '>=', min_area), ('area', '<=', max_area)):
+        if value is not None:
+            sql += f' AND p.{column} {op} ?'
+            params.append(value)
+    return sql, params
+
+
+def in_bbox(conn: sqlite3.Connection, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+            min_price: Optional[float] = None, max_price: Optional[float] = None,
+            min_area: Optional[float] = None, max_area: Optional[float] = None,
+            active_only: bool = True, limit: int = 200) -> List[Dict]:
+    """Oferty w prostokącie, najtańsze za m² najpierw"""
+    extra, params = _filters(min_price, max_price, min_area, max_area)
+    if active_only:
+        extra += ' AND p.is_active = 1'
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    rows = cur.execute(f'''
+        SELECT p.* FROM properties_geo g JOIN properties p ON p.id = g.id
+        WHERE g.min_lat >= ? AND g.max_lat <= ? AND g.min_lon >= ? AND g.max_lon <= ? {extra}
+        ORDER BY p.price_per_m2 LIMIT ?''', [min_lat, max_lat, min_lon, max_lon, *params, limit]).fetchall()
+    return [dict(r) for r in rows]
+
+
+def within_radius(conn: sqlite3.Connection, lat: float, lon: float, km: float,
+                  min_price: Optional[float] = None, max_price: Optional[float] = None,
+                  min_area: Optional[float] = None, max_area: Optional[float] = None,
+                  active_only: bool = True, limit: int = 200) -> List[Dict]:
+    """
+    Oferty w promieniu km od punktu, najbliższe najpierw. R*Tree zawęża wyniki
+    do prostokąta opisanego na okręgu, dokładną odległość liczy haversine.
+    """
+    conn.create_function('haversine_km', 4, haversine_km, deterministic=True)
+    min_lat, min_lon, max_lat, max_lon = bbox_around(lat, lon, km)
+    extra, params = _filters(min_price, max_price, min_area, max_area)
+    if active_only:
+        extra += ' AND p.is_active = 1'
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    rows = cur.execute(f'''
+        SELECT p.*, haversine_km(?, ?, g.min_lat, g.min_lon) AS distance_km
+        FROM properties_geo g JOIN properties p ON p.id = g.id
+        WHERE g.min_lat >= ? AND g.max_lat <= ? AND g.min_lon >= ? AND g.max_lon <= ? {extra}
+          AND distance_km <= ?
+        ORDER BY distance_km LIMIT ?''',
+        [lat, lon, min_lat, max_lat, min_lon, max_lon, *params, km, limit]).fetchall()
+    return [dict(r) for r in rows]
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Model oferty: zwarty rekord Listing i kolumnowa paczka ListingBatch
+"""
+
+import sys
+import math
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Portal:
+    """Stałe nazw portali (zinternowane - jedna kopia napisu na cały proces)"""
+    OTODOM = sys.intern('otodom')
+    OLX = sys.intern('olx')
+
+
+DEFAULT_LOCATION = sys.intern('Wrocław')
+
+
+class Listing:
+    """Pojedyncza oferta. __slots__ zamiast dict - bez słownika na każdy rekord"""
+
+    __slots__ = ('portal', 'title', 'price', 'area', 'price_per_m2', 'location', 'url', 'lat', 'lon')
+
+    def __init__(self, portal: str, title: str, price: float, area: float,
+                 url: str, location: str = DEFAULT_LOCATION,
+                 lat: Optional[float] = None, lon: Optional[float] = None):
+        self.portal = sys.intern(portal)
+        self.title = title
+        self.price = float(price)
+        self.area = float(area)
+        self.price_per_m2 = round(self.price / self.area, 2) if self.area > 0 else 0.0
+        self.location = sys.intern(location) if location else DEFAULT_LOCATION
+        self.url = url
+        self.lat = float(lat) if lat is not None else None
+        self.lon = float(lon) if lon is not None else None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'Listing':
+        return cls(d['portal'], d.get('title', ''), d.get('price') or 0,
+                   d.get('area') or 0, d['url'], d.get('location') or DEFAULT_LOCATION,
+                   d.get('lat'), d.get('lon'))
+
+    def as_row(self, now: str) -> Tuple:
+        """Krotka parametrów dla INSERT INTO properties (...)"""
+        return (self.portal, self.title, self.price, self.area, self.price_per_m2,
+                self.location, self.url, now, now, self.lat, self.lon)
+
+    def __repr__(self):
+        return f"Listing({self.portal!r}, {self.price:,.0f} zł, {self.area} m², {self.url!r})"
+
+
+class ListingBatch:
+    """
+    Kolumnowa paczka ofert. Liczby trzymane w array('d'), portal i lokalizacja
+    jako kody w array('H') wskazujące na wspólną tablicę zinternowanych napisów.
+    Brak współrzędnych zapisywany jest jako NaN.
+    """
+
+    # Wspólny słownik kodów - portali i dzielnic jest kilkadziesiąt, nie tysiące
+    _names: List[str] = []
+    _codes: Dict[str, int] = {}
+    _codes_lock = threading.Lock()  # scrapery dopisują nowe nazwy z kilku wątków naraz
+
+    __slots__ = ('portal', 'location', 'price', 'area', 'price_per_m2', 'title', 'url', 'lat', 'lon')
+
+    def __init__(self):
+        self.portal = array('H')
+        self.location = array('H')
+        self.price = array('d')
+        self.area = array('d')
+        self.price_per_m2 = array('d')
+        self.title: List[str] = []
+        self.url: List[str] = []
+        self.lat = array('d')
+        self.lon = array('d')
+
+    @classmethod
+    def _code(cls, name: str) -> int:
+        code = cls._codes.get(name)
+        if code is None:
+            with cls._codes_lock:
+                # Ponowne sprawdzenie - inny wątek mógł dodać nazwę przed nami
+                code = cls._codes.get(name)
+                if code is None:
+                    code = len(cls._names)
+                    cls._names.append(sys.intern(name))
+                    cls._codes[name] = code
+        return code
+
+    def append(self, listing: Listing):
+        self.portal.append(self._code(listing.portal))
+        self.location.append(self._code(listing.location))
+        self.price.append(listing.price)
+        self.area.append(listing.area)
+        self.price_per_m2.append(listing.price_per_m2)
+        self.title.append(listing.title)
+        self.url.append(listing.url)
+        self.lat.append(math.nan if listing.lat is None else listing.lat)
+        self.lon.append(math.nan if listing.lon is None else listing.lon)
+
+    def append_from(self, other: 'ListingBatch', i: int):
+        """Kopiuje i-ty wiersz innej paczki bez tworzenia obiektu Listing"""
+        self.portal.append(other.portal[i])
+        self.location.append(other.location[i])
+        self.price.append(other.price[i])
+        self.area.append(other.area[i])
+        self.price_per_m2.append(other.price_per_m2[i])
+        self.title.append(other.title[i])
+        self.url.append(other.url[i])
+        self.lat.append(other.lat[i])
+        self.lon.append(other.lon[i])
+
+    def __len__(self):
+        return len(self.url)
+
+    def __getitem__(self, i: int) -> Listing:
+        names = self._names
+        listing = Listing.__new__(Listing)
+        listing.portal = names[self.portal[i]]
+        listing.title = self.title[i]
+        listing.price = self.price[i]
+        listing.area = self.area[i]
+        listing.price_per_m2 = self.price_per_m2[i]
+        listing.location = names[self.location[i]]
+        listing.url = self.url[i]
+        listing.lat = None if math.isnan(self.lat[i]) else self.lat[i]
+        listing.lon = None if math.isnan(self.lon[i]) else self.lon[i]
+        return listing
+
+    def __iter__(self) -> Iterator[Listing]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self, now: str) -> Iterator[Tuple]:
+        """Krotki parametrów dla INSERT INTO properties (...) prosto z kolumn"""
+        names = self._names
+        for portal, title, price, area, ppm2, location, url, lat, lon in zip(
+                self.portal, self.title, self.price, self.area,
+                self.price_per_m2, self.location, self.url, self.lat, self.lon):
+            # NaN != NaN - tak bez wywołań funkcji zamieniamy brak współrzędnych na NULL
+            yield (names[portal], title, price, area, ppm2, names[location], url, now, now,
+                   lat if lat == lat else None, lon if lon == lon else None)
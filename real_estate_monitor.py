@@ -4,10 +4,43 @@ import sqlite3
 import requests
 import threading
 import json
+import queue
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Iterator
 from bs4 import BeautifulSoup
 from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from listing import Listing, ListingBatch, Portal, DEFAULT_LOCATION
+from retention import enable_incremental_vacuum, archive_inactive, vacuum_step
+from events import EventBroadcaster
+from valuation import Valuator
+import geo
+
+# Skrypt dashboardu: nakłada zmiany z /events na stronę bez jej przeładowania
+DASHBOARD_JS = """
+// LAST_EVENT_ID osadza generate_dashboard - serwer dośle zdarzenia nowsze niż ta wersja strony
+const es = new EventSource('/events?last_id=' + LAST_EVENT_ID);
+const card = id => document.getElementById('p' + id);
+es.addEventListener('new', e => JSON.parse(e.data).forEach(c => {
+    if (!card(c.id)) document.getElementById('grid').insertAdjacentHTML('afterbegin', c.html);
+}));
+es.addEventListener('price', e => JSON.parse(e.data).forEach(c => {
+    const el = card(c.id);
+    if (!el) return;
+    el.querySelector('.js-price').textContent = c.price_text;
+    el.querySelector('.js-ppm2').textContent = c.ppm2_text;
+}));
+es.addEventListener('delisted', e => JSON.parse(e.data).forEach(id => {
+    const el = card(id);
+    if (el) el.classList.add('opacity-50');
+}));
+es.addEventListener('relisted', e => JSON.parse(e.data).forEach(id => {
+    const el = card(id);
+    if (el) el.classList.remove('opacity-50');
+}));
+// Zaległości nie do odtworzenia z historii serwera - pełny stan ma świeża strona
+es.addEventListener('reload', () => location.reload());
+"""
 
 # KLASA WYMUSZAJĄCA POPRAWNE RENDEROWANIE HTML
 class MyHandler(SimpleHTTPRequestHandler):
@@ -16,15 +49,89 @@ class MyHandler(SimpleHTTPRequestHandler):
             self.send_header("Content-Type", "text/html; charset=utf-8")
         super().end_headers()
 
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/events":
+            return self.serve_events(url.query)
+        if url.path in ("/api/nearby", "/api/bbox"):
+            return self.serve_geo(url.path, url.query)
+        super().do_GET()
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_geo(self, path: str, query: str):
+        # /api/nearby?lat=51.11&lon=17.03&km=2  /api/bbox?min_lat=..&min_lon=..&max_lat=..&max_lon=..
+        # opcjonalnie: min_price, max_price, min_area, max_area, limit
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        try:
+            filters = {k: float(params[k]) for k in ('min_price', 'max_price', 'min_area', 'max_area') if k in params}
+            limit = max(1, min(int(params.get('limit', 200)), 1000))  # -1 w SQLite znaczy "bez limitu"
+            with sqlite3.connect(self.server.db_path) as conn:
+                if path == "/api/nearby":
+                    rows = geo.within_radius(conn, float(params['lat']), float(params['lon']),
+                                             float(params.get('km', 1)), limit=limit, **filters)
+                else:
+                    rows = geo.in_bbox(conn, float(params['min_lat']), float(params['min_lon']),
+                                       float(params['max_lat']), float(params['max_lon']), limit=limit, **filters)
+        except (KeyError, ValueError) as e:
+            return self.send_json(400, {'error': f"Nieprawidłowy lub brakujący parametr: {e}"})
+        except sqlite3.Error as e:
+            # Np. baza zablokowana przez import - klient dostaje JSON zamiast zerwanego połączenia
+            return self.send_json(503, {'error': f"Baza chwilowo niedostępna: {e}"})
+        self.send_json(200, rows)
+
+    def serve_events(self, query: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(b"retry: 3000\n\n")
+        # Gniazdo przejmuje wątek rozgłaszający - handler kończy pracę od razu
+        self.close_connection = True
+        # Przy wznowieniu przeglądarka wysyła nagłówek, przy pierwszym połączeniu - id ze strony
+        last_id = self.headers.get("Last-Event-ID") or parse_qs(query).get("last_id", [None])[0]
+        self.server.broadcaster.subscribe(self.connection, last_id)
+
+class MonitorHTTPServer(HTTPServer):
+    # Setki kart łączą się ponownie naraz po restarcie - domyślne 5 gubi połączenia
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, broadcaster: EventBroadcaster, db_path: str):
+        super().__init__(server_address, handler_class)
+        self.broadcaster = broadcaster
+        self.db_path = db_path
+
+    def shutdown_request(self, request):
+        # Nie zamykamy połączeń /events przekazanych do EventBroadcaster
+        if self.broadcaster.owns(request):
+            return
+        super().shutdown_request(request)
+
 class RealEstateMonitor:
     def __init__(self):
         # 1. Definicja parametrów bazowych
         self.db_path = 'properties.db'
+        self.archive_dir = 'archive'
         self.port = int(os.environ.get('PORT', 10000))
         
         # 2. Konfiguracja z interwałem
         self.config = {
             'update_interval': 1800,  # 30 minut
+            'max_pages': 5,           # ile stron wyników pobierać z każdego portalu
+            'queue_size': 4,          # ile stron może czekać w kolejce na zapis
+            'batch_size': 200,        # ile ofert zapisujemy w jednej transakcji
+            'retention_days': 90,     # po ilu dniach bez zobaczenia oferta idzie do archiwum
+            'vacuum_pages': 64,       # ile stron zwalnia jeden krok VACUUM
+            'vacuum_pause': 5,        # sekundy przerwy między krokami VACUUM
+            'delist_after_hours': 24, # po ilu godzinach bez zobaczenia oferta jest zdjęta (= nie ma jej
+                                      # w pierwszych max_pages stronach - starsze oferty też wypadają)
+            'bargain_score': -1.5,    # z-score ceny za m², od którego oferta to okazja
             'criteria': {
                 'min_price': 300000,
                 'max_price': 1000000,
@@ -33,108 +140,278 @@ class RealEstateMonitor:
             }
         }
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        # Osobna sesja dla każdego scrapera - requests.Session nie jest bezpieczna wątkowo
+        self.sessions = {portal: self._new_session() for portal in (Portal.OTODOM, Portal.OLX)}
         
-        # 3. Inicjalizacja bazy
+        # 3. Kanał zdarzeń dla dashboardu
+        self.events = EventBroadcaster()
+
+        # 4. Wycena względem segmentu rynku
+        self.valuator = Valuator(self.config['bargain_score'])
+
+        # 5. Inicjalizacja bazy
         self._init_db()
 
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        })
+        return session
+
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
+            enable_incremental_vacuum(conn)
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS properties (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     portal TEXT, title TEXT, price REAL, area REAL, 
                     price_per_m2 REAL, location TEXT, url TEXT UNIQUE, 
-                    first_seen TEXT, last_seen TEXT
+                    first_seen TEXT, last_seen TEXT, is_active INTEGER DEFAULT 1,
+                    score REAL, lat REAL, lon REAL
                 )
             ''')
+            # Migracja starszych baz bez nowych kolumn
+            columns = [c[1] for c in conn.execute('PRAGMA table_info(properties)')]
+            if 'is_active' not in columns:
+                conn.execute('ALTER TABLE properties ADD COLUMN is_active INTEGER DEFAULT 1')
+            if 'score' not in columns:
+                conn.execute('ALTER TABLE properties ADD COLUMN score REAL')
+            if 'lat' not in columns:
+                conn.execute('ALTER TABLE properties ADD COLUMN lat REAL')
+                conn.execute('ALTER TABLE properties ADD COLUMN lon REAL')
+            geo.init_db(conn)
+            Valuator.init_db(conn)
+            self.valuator.load(conn)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_properties_last_seen ON properties(last_seen)')
 
-    def scrape_otodom(self) -> List[Dict]:
+    # Scrapery zwracają (przez StopIteration) True, gdy pobrały wszystkie strony bez błędu
+    def scrape_otodom(self) -> Iterator[ListingBatch]:
         print("🔍 Pobieranie danych z Otodom...", flush=True)
-        found = []
-        url = "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/dolnoslaskie/wroclaw/wroclaw/wroclaw?limit=36&by=DEFAULT&direction=DESC"
+        base_url = "https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/dolnoslaskie/wroclaw/wroclaw/wroclaw?limit=36&by=DEFAULT&direction=DESC"
+        for page in range(1, self.config['max_pages'] + 1):
+            found = ListingBatch()
+            try:
+                res = self.sessions[Portal.OTODOM].get(f"{base_url}&page={page}", timeout=15)
+                soup = BeautifulSoup(res.content, 'html.parser')
+                script = soup.find('script', id='__NEXT_DATA__')
+                if not script:
+                    print(f"❌ Otodom Error (strona {page}): brak __NEXT_DATA__", flush=True)
+                    return False
+
+                data = json.loads(script.string)
+                items = data['props']['pageProps']['data']['searchAds']['items']
+
+                for item in items:
+                    price = float(item.get('totalPrice', {}).get('value') or 0)
+
+                    # POPRAWKA METRAŻU: Szukamy w charakterystyce
+                    area = 0.0
+                    for char in item.get('characteristics', []):
+                        if char.get('key') == 'm':
+                            try: area = float(char.get('value').replace(',', '.'))
+                            except: pass
+
+                    if area == 0: # Backup
+                        area = float(item.get('area', {}).get('value') or 0)
+
+                    district, lat, lon = self._otodom_location(item)
+                    found.append(Listing(
+                        Portal.OTODOM, item.get('title', ''), price, area,
+                        f"https://www.otodom.pl/pl/oferta/{item.get('slug', '')}",
+                        district or DEFAULT_LOCATION, lat, lon
+                    ))
+            except Exception as e:
+                print(f"❌ Otodom Error (strona {page}): {e}", flush=True)
+                return False
+            if not found: return page > 1  # pusta pierwsza strona to raczej blokada niż brak ofert
+            yield found
+        return True
+
+    def _otodom_location(self, item: dict):
+        # Dzielnica i współrzędne z __NEXT_DATA__; brakujące pola zwracamy jako None
+        location = item.get('location') or {}
+        district = None
+        for loc in (location.get('reverseGeocoding') or {}).get('locations') or []:
+            if loc.get('locationLevel') == 'district':
+                district = loc.get('name') or loc.get('fullName', '').split(',')[0] or None
+        if not district:
+            district = ((location.get('address') or {}).get('district') or {}).get('name')
+
+        coords = location.get('coordinates') or location.get('mapDetails') or {}
+        lat, lon = coords.get('latitude'), coords.get('longitude')
         try:
-            res = self.session.get(url, timeout=15)
-            soup = BeautifulSoup(res.content, 'html.parser')
-            script = soup.find('script', id='__NEXT_DATA__')
-            if not script: return []
-            
-            data = json.loads(script.string)
-            items = data['props']['pageProps']['data']['searchAds']['items']
-            
-            for item in items:
-                price = float(item.get('totalPrice', {}).get('value') or 0)
-                
-                # POPRAWKA METRAŻU: Szukamy w charakterystyce
-                area = 0.0
-                for char in item.get('characteristics', []):
-                    if char.get('key') == 'm':
-                        try: area = float(char.get('value').replace(',', '.'))
-                        except: pass
-                
-                if area == 0: # Backup
-                    area = float(item.get('area', {}).get('value') or 0)
-
-                found.append({
-                    'portal': 'otodom', 'title': item.get('title', ''),
-                    'price': price, 'area': area,
-                    'price_per_m2': round(price/area, 2) if area > 0 else 0,
-                    'location': 'Wrocław',
-                    'url': f"https://www.otodom.pl/pl/oferta/{item.get('slug', '')}"
-                })
-        except Exception as e: print(f"❌ Otodom Error: {e}", flush=True)
-        return found
-
-    def scrape_olx(self) -> List[Dict]:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            lat, lon = None, None
+        return district, lat, lon
+
+    def scrape_olx(self) -> Iterator[ListingBatch]:
         print("🔍 Pobieranie danych z OLX...", flush=True)
-        found = []
-        url = "https://www.olx.pl/nieruchomosci/mieszkania/sprzedaz/wroclaw/?search[order]=created_at:desc"
+        base_url = "https://www.olx.pl/nieruchomosci/mieszkania/sprzedaz/wroclaw/?search[order]=created_at:desc"
+        for page in range(1, self.config['max_pages'] + 1):
+            found = ListingBatch()
+            try:
+                res = self.sessions[Portal.OLX].get(f"{base_url}&page={page}", timeout=15)
+                soup = BeautifulSoup(res.content, 'html.parser')
+                cards = soup.find_all('div', {'data-testid': 'ad-card'})
+                for card in cards:
+                    link = card.find('a', href=True)
+                    if not link or 'promoted' in link['href']: continue
+                    full_url = link['href'] if link['href'].startswith('http') else f"https://www.olx.pl{link['href']}"
+                    price_text = card.find('p', {'data-testid': 'ad-price'}).get_text() if card.find('p', {'data-testid': 'ad-price'}) else "0"
+                    price = float("".join(filter(str.isdigit, price_text.split(',')[0])))
+                    found.append(Listing(
+                        Portal.OLX, card.find('h6').get_text() if card.find('h6') else "",
+                        price, 0, full_url, DEFAULT_LOCATION
+                    ))
+            except Exception as e:
+                print(f"❌ OLX Error (strona {page}): {e}", flush=True)
+                return False
+            if not found: return page > 1
+            yield found
+        return True
+
+    def _put(self, pages: queue.Queue, item, stop: threading.Event) -> bool:
+        # put z limitem czasu - producent nie wisi na pełnej kolejce, gdy konsument przestał czytać
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce_pages(self, portal: str, scraper, pages: queue.Queue, stop: threading.Event, completed: set):
+        # Producent: wrzuca kolejne strony do ograniczonej kolejki (czeka, gdy jest pełna).
+        # Portal trafia do completed tylko wtedy, gdy scraper doszedł do końca bez błędu.
+        try:
+            scraped = scraper()
+            while True:
+                try:
+                    page = next(scraped)
+                except StopIteration as done:
+                    if done.value:
+                        completed.add(portal)
+                    return
+                if not self._put(pages, page, stop):
+                    return
+        finally:
+            self._put(pages, None, stop)  # znacznik końca dla konsumenta
+
+    def _iter_batches(self, pages: queue.Queue, producers: int) -> Iterator[ListingBatch]:
+        # Konsument: składa strony w paczki o stałym rozmiarze
+        batch_size = self.config['batch_size']
+        batch = ListingBatch()
+        finished = 0
+        while finished < producers:
+            page = pages.get()
+            if page is None:
+                finished += 1
+                continue
+            for i in range(len(page)):
+                batch.append_from(page, i)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = ListingBatch()
+        if batch:
+            yield batch
+
+    def run_cycle(self):
+        # Strumieniowy cykl: scrapery -> kolejka stron -> paczki -> baza.
+        # W pamięci jest naraz co najwyżej queue_size stron + jedna paczka.
+        scrapers = {Portal.OTODOM: self.scrape_otodom, Portal.OLX: self.scrape_olx}
+        pages = queue.Queue(maxsize=self.config['queue_size'])
+        stop = threading.Event()
+        completed = set()
+        for portal, scraper in scrapers.items():
+            threading.Thread(target=self._produce_pages, args=(portal, scraper, pages, stop, completed),
+                             daemon=True).start()
+
+        total, new_count = 0, 0
         try:
-            res = self.session.get(url, timeout=15)
-            soup = BeautifulSoup(res.content, 'html.parser')
-            cards = soup.find_all('div', {'data-testid': 'ad-card'})
-            for card in cards:
-                link = card.find('a', href=True)
-                if not link or 'promoted' in link['href']: continue
-                full_url = link['href'] if link['href'].startswith('http') else f"https://www.olx.pl{link['href']}"
-                price_text = card.find('p', {'data-testid': 'ad-price'}).get_text() if card.find('p', {'data-testid': 'ad-price'}) else "0"
-                price = float("".join(filter(str.isdigit, price_text.split(',')[0])))
-                found.append({
-                    'portal': 'olx', 'title': card.find('h6').get_text() if card.find('h6') else "",
-                    'price': price, 'area': 0, 'price_per_m2': 0, 'location': 'Wrocław', 'url': full_url
-                })
-        except Exception as e: print(f"❌ OLX Error: {e}", flush=True)
-        return found
-
-    def save_and_filter(self, properties: List[Dict]):
+            for batch in self._iter_batches(pages, len(scrapers)):
+                total += len(batch)
+                new_count += len(self.save_and_filter(batch))
+        finally:
+            stop.set()  # przy błędzie zapisu producenci kończą zamiast czekać na miejsce w kolejce
+        return total, new_count, completed
+
+    def save_and_filter(self, properties: ListingBatch) -> List[Listing]:
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        new_ones = []
+        new_ones, new_ids, new_cards, price_changes, relisted = [], [], [], [], []
         with sqlite3.connect(self.db_path) as conn:
-            for p in properties:
-                if not (self.config['criteria']['min_price'] <= p['price'] <= self.config['criteria']['max_price']):
+            for i, row in enumerate(properties.rows(now)):
+                if not (self.config['criteria']['min_price'] <= properties.price[i] <= self.config['criteria']['max_price']):
                     continue
+                # Ocena względem segmentu sprzed dodania oferty - oferta nie ocenia sama siebie
+                portal, location, area, ppm2 = row[0], row[5], properties.area[i], properties.price_per_m2[i]
+                score = self.valuator.score(portal, location, area, ppm2)
                 try:
-                    conn.execute('''INSERT INTO properties (portal, title, price, area, price_per_m2, location, url, first_seen, last_seen)
-                                    VALUES (?,?,?,?,?,?,?,?,?)''', 
-                                    (p['portal'], p['title'], p['price'], p['area'], p['price_per_m2'], p['location'], p['url'], now, now))
-                    new_ones.append(p)
+                    cur = conn.execute('''INSERT INTO properties (portal, title, price, area, price_per_m2, location, url, first_seen, last_seen, lat, lon, score)
+                                          VALUES (?,?,?,?,?,?,?,?,?,?,?,?)''', row + (score,))
+                    self.valuator.observe(portal, location, area, ppm2)
+                    new_ones.append(properties[i])
+                    new_ids.append(cur.lastrowid)
                 except sqlite3.IntegrityError:
-                    conn.execute('UPDATE properties SET last_seen = ? WHERE url = ?', (now, p['url']))
+                    prop_id, old_price, was_active = conn.execute('SELECT id, price, is_active FROM properties WHERE url = ?',
+                                                                  (properties.url[i],)).fetchone()
+                    if not was_active:
+                        relisted.append(prop_id)  # wróciła po oznaczeniu jako zdjęta
+                    price, lat, lon = properties.price[i], row[9], row[10]
+                    if lat is not None:
+                        conn.execute('UPDATE properties SET lat = ?, lon = ? WHERE id = ? AND (lat IS NOT ? OR lon IS NOT ?)',
+                                     (lat, lon, prop_id, lat, lon))
+                    if price != old_price:
+                        conn.execute('UPDATE properties SET last_seen = ?, is_active = 1, price = ?, price_per_m2 = ?, score = ? WHERE id = ?',
+                                     (now, price, ppm2, score, prop_id))
+                        price_changes.append({'id': prop_id, 'old_price': old_price,
+                                              'price_text': f"{price:,} zł", 'ppm2_text': f"({ppm2:,} zł/m²)"})
+                    else:
+                        conn.execute('UPDATE properties SET last_seen = ?, is_active = 1 WHERE id = ?', (now, prop_id))
+
+            self.valuator.save(conn)
+            if new_ids:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(f"SELECT * FROM properties WHERE id IN ({','.join('?' * len(new_ids))})", new_ids).fetchall()
+                new_cards = [{'id': r['id'], 'html': self._render_card(r)} for r in rows]
+        # Zdarzenia dopiero po commicie - klient nie zobaczy niezapisanych zmian
+        if new_cards:
+            self.events.publish('new', new_cards)
+        if price_changes:
+            self.events.publish('price', price_changes)
+        if relisted:
+            self.events.publish('relisted', relisted)
+        if new_cards or price_changes or relisted:
+            # Strona otwarta w trakcie cyklu ma od razu aktualny stan, a nie ten sprzed cyklu
+            self.generate_dashboard()
         return new_ones
 
-    def generate_dashboard(self):
+    def mark_delisted(self, portals) -> int:
+        # Oferta niewidziana od delist_after_hours uznawana jest za zdjętą z portalu - tylko dla
+        # portali, których scraper przeszedł cały cykl; przy błędzie nie wiemy, czego nie widzieliśmy
+        portals = list(portals)
+        if not portals:
+            return 0
+        cutoff = (datetime.now() - timedelta(hours=self.config['delist_after_hours'])).strftime('%Y-%m-%d %H:%M:%S')
         with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute('SELECT * FROM properties ORDER BY first_seen DESC LIMIT 60').fetchall()
-        
-        cards = ""
-        for r in rows:
-            color = "#00b54b" if r['portal'] == 'otodom' else "#002f34"
-            cards += f"""
-            <div class="col-md-6 col-lg-4 mb-4">
+            ids = [r[0] for r in conn.execute(f'''SELECT id FROM properties WHERE is_active = 1 AND last_seen < ?
+                                                  AND portal IN ({','.join('?' * len(portals))})''',
+                                              (cutoff, *portals))]
+            conn.executemany('UPDATE properties SET is_active = 0 WHERE id = ?', [(i,) for i in ids])
+        if ids:
+            self.events.publish('delisted', ids)
+        return len(ids)
+
+    def _render_card(self, r) -> str:
+        color = "#00b54b" if r['portal'] == 'otodom' else "#002f34"
+        faded = "" if r['is_active'] else " opacity-50"
+        valuation = ""
+        if r['score'] is not None:
+            bargain = '<span class="badge bg-warning text-dark">🔥 OKAZJA</span> ' if self.valuator.is_bargain(r['score']) else ''
+            valuation = f'<p class="mb-1 small">{bargain}<strong>Wycena:</strong> {r["score"]:+.1f}σ względem segmentu</p>'
+        return f"""
+            <div class="col-md-6 col-lg-4 mb-4{faded}" id="p{r['id']}">
                 <div class="card h-100 shadow-sm border-0">
                     <div class="card-header bg-white border-0 pt-3 d-flex justify-content-between">
                         <span class="badge" style="background-color: {color}; color: white;">{r['portal'].upper()}</span>
@@ -143,11 +420,12 @@ class RealEstateMonitor:
                     <div class="card-body">
                         <h6 class="card-title fw-bold text-dark">{r['title'][:70]}</h6>
                         <div class="my-2">
-                            <span class="h4 text-danger fw-bold">{r['price']:,} zł</span><br>
-                            <small class="text-muted">({r['price_per_m2']:,} zł/m²)</small>
+                            <span class="h4 text-danger fw-bold js-price">{r['price']:,} zł</span><br>
+                            <small class="text-muted js-ppm2">({r['price_per_m2']:,} zł/m²)</small>
                         </div>
                         <p class="mb-1 small"><strong>Powierzchnia:</strong> {r['area']} m²</p>
-                        <p class="small text-muted"><i class="bi bi-geo-alt"></i> Wrocław</p>
+                        {valuation}
+                        <p class="small text-muted"><i class="bi bi-geo-alt"></i> {r['location']}</p>
                     </div>
                     <div class="card-footer bg-light border-0 py-3">
                         <div class="row g-0 text-center small mb-3">
@@ -159,6 +437,15 @@ class RealEstateMonitor:
                 </div>
             </div>"""
 
+    def generate_dashboard(self):
+        # Id odczytane przed zapytaniem: zdarzenia nowsze niż ono klient dostanie z historii
+        last_id = self.events.last_id
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute('SELECT * FROM properties ORDER BY first_seen DESC LIMIT 60').fetchall()
+        
+        cards = "".join(self._render_card(r) for r in rows)
+
         html = f"""<!DOCTYPE html><html lang="pl"><head><meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/bootstrap.min.css" rel="stylesheet">
@@ -166,28 +453,52 @@ class RealEstateMonitor:
         <style>body{{background-color:#f8f9fa;}} .card{{transition: 0.2s;}} .card:hover{{transform:translateY(-5px);}}</style>
         </head><body><div class="container py-5">
         <h2 class="mb-5 fw-bold text-center">🏠 Wrocław Property Monitor</h2>
-        <div class="row">{cards}</div></div></body></html>"""
+        <div class="row" id="grid">{cards}</div></div>
+        <script>const LAST_EVENT_ID = {last_id};{DASHBOARD_JS}</script></body></html>"""
         
-        with open('index.html', 'w', encoding='utf-8') as f:
+        # Podmiana przez os.replace - serwer nigdy nie odda w połowie zapisanej strony
+        with open('index.html.tmp', 'w', encoding='utf-8') as f:
             f.write(html)
+        os.replace('index.html.tmp', 'index.html')
+
+    def idle(self, seconds: float):
+        # Czas między cyklami wykorzystujemy na małe kroki VACUUM zamiast jednego długiego
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                remaining = vacuum_step(self.db_path, self.config['vacuum_pages'])
+            except sqlite3.Error as e:
+                print(f"❌ VACUUM Error: {e}", flush=True)
+                remaining = 0
+            pause = self.config['vacuum_pause'] if remaining else deadline - time.monotonic()
+            time.sleep(max(0, min(pause, deadline - time.monotonic())))
 
     def run_server(self):
         server_address = ('', self.port)
-        httpd = HTTPServer(server_address, MyHandler) # UŻYCIE POPRAWIONEGO HANDLERA
+        httpd = MonitorHTTPServer(server_address, MyHandler, self.events, self.db_path) # UŻYCIE POPRAWIONEGO HANDLERA
+        self.events.start()
         print(f"🚀 Serwer działa na porcie {self.port}", flush=True)
         httpd.serve_forever()
 
     def start_monitoring(self):
         while True:
-            all_offers = self.scrape_otodom() + self.scrape_olx()
-            new_ones = self.save_and_filter(all_offers)
-            print(f"✨ Znaleziono {len(all_offers)} ofert, {len(new_ones)} nowych.", flush=True)
-            self.generate_dashboard()
-            
+            try:
+                total, new_count, completed = self.run_cycle()
+                delisted = self.mark_delisted(completed)
+                print(f"✨ Znaleziono {total} ofert, {new_count} nowych, {delisted} zdjętych.", flush=True)
+                self.generate_dashboard()
+
+                archived = archive_inactive(self.db_path, self.archive_dir, self.config['retention_days'])
+                if archived:
+                    print(f"📦 Zarchiwizowano {archived} nieaktywnych ofert.", flush=True)
+            except sqlite3.OperationalError as e:
+                # Np. baza zablokowana przez import historii - ponawiamy w następnym cyklu zamiast kończyć proces
+                print(f"❌ Błąd bazy: {e} - ponowię w następnym cyklu", flush=True)
+
             interval = self.config.get('update_interval', 1800)
             next_run = datetime.now() + timedelta(seconds=interval)
             print(f"💤 Następny start: {next_run.strftime('%H:%M:%S')}", flush=True)
-            time.sleep(interval)
+            self.idle(interval)
 
 if __name__ == "__main__":
     monitor = RealEstateMonitor()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Retencja danych: archiwizacja starych ofert i przyrostowy VACUUM bazy
+"""
+
+import os
+import glob
+import gzip
+import json
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+ARCHIVE_CHUNK = 1000
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection):
+    """Włącza auto_vacuum=INCREMENTAL. Dla istniejącej bazy wymaga jednorazowego VACUUM."""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+
+
+def vacuum_step(db_path: str, pages: int) -> int:
+    """Zwalnia do `pages` wolnych stron. Zwraca liczbę wolnych stron, które zostały."""
+    with sqlite3.connect(db_path) as conn:
+        # executescript, bo execute() wykonuje tylko jeden krok i zwalnia jedną stronę
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+        return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def _partition_path(archive_dir: str, last_seen: str, first_id: int) -> str:
+    # Partycje miesięczne wg daty ostatniego zobaczenia, osobny plik na każdą paczkę:
+    # properties_2026-03.<id pierwszej oferty>.jsonl.gz
+    return os.path.join(archive_dir, f"properties_{last_seen[:7]}.{first_id}.jsonl.gz")
+
+
+def _write_partition(path: str, rows: list):
+    # Zapis do pliku tymczasowego i os.replace - w archiwum nigdy nie ma uciętego pliku
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as f:
+            for r in rows:
+                f.write(json.dumps(dict(r), ensure_ascii=False) + '\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+
+def archive_inactive(db_path: str, archive_dir: str, max_age_days: int) -> int:
+    """
+    Przenosi oferty niewidziane dłużej niż max_age_days do skompresowanych plików
+    w archive_dir. DELETE wykonuje się dopiero po podmianie plików paczki -
+    przerwanie w połowie może najwyżej zdublować paczkę w archiwum, nigdy jej nie zgubić.
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    os.makedirs(archive_dir, exist_ok=True)
+    for tmp in glob.glob(os.path.join(archive_dir, '*.tmp')):
+        os.remove(tmp)  # pozostałość po przerwanym zapisie - wiersze wciąż są w bazie
+    moved = 0
+
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        while True:
+            rows = conn.execute('''SELECT * FROM properties WHERE last_seen < ?
+                                   ORDER BY last_seen, id LIMIT ?''', (cutoff, ARCHIVE_CHUNK)).fetchall()
+            if not rows:
+                break
+
+            partitions: Dict[str, list] = {}
+            for r in rows:
+                partitions.setdefault(r['last_seen'][:7], []).append(r)
+
+            # Nazwa z id pierwszej oferty - ponowienie przerwanej paczki nadpisuje ten sam plik
+            for month, part in partitions.items():
+                _write_partition(_partition_path(archive_dir, month, part[0]['id']), part)
+
+            conn.executemany('DELETE FROM properties WHERE id = ?', [(r['id'],) for r in rows])
+            conn.commit()
+            moved += len(rows)
+
+    return moved
+
+
+def query_archive(archive_dir: str, since: Optional[str] = None,
+                  until: Optional[str] = None, **filters) -> Iterator[Dict]:
+    """
+    Przeszukuje archiwum. since/until to miesiące 'RRRR-MM' (włącznie) - pliki
+    spoza zakresu są pomijane bez otwierania. filters: dokładne dopasowanie pól,
+    np. portal='otodom'.
+    """
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'properties_*.jsonl.gz'))):
+        month = os.path.basename(path)[len('properties_'):len('properties_RRRR-MM')]
+        if (since and month < since) or (until and month > until):
+            continue
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    if all(row.get(k) == v for k, v in filters.items()):
+                        yield row
+        except (OSError, EOFError, zlib.error, ValueError) as e:
+            # Uszkodzony plik (np. błąd dysku) nie blokuje przeszukiwania reszty archiwum
+            print(f"❌ Archiwum: pomijam resztę pliku {path}: {e}", flush=True)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--query':
+        since = sys.argv[2] if len(sys.argv) > 2 else None
+        until = sys.argv[3] if len(sys.argv) > 3 else None
+        count = 0
+        for row in query_archive('archive', since, until):
+            print(f"  {row['last_seen'][:10]} • {row['price']:,.0f} PLN • {row['portal']} • {row['url']}")
+            count += 1
+        print(f"\n✓ Znaleziono w archiwum: {count}")
+    else:
+        days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+        with sqlite3.connect('properties.db') as conn:
+            enable_incremental_vacuum(conn)
+        moved = archive_inactive('properties.db', 'archive', days)
+        print(f"✓ Zarchiwizowano {moved} ofert starszych niż {days} dni")
+        while vacuum_step('properties.db', 256):
+            pass
+        print("✓ Baza skompaktowana")
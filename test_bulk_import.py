@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Testy normalizacji rekordów importu historii (python -m unittest test_bulk_import)
+"""
+
+import os
+import json
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+import geo
+from bulk_import import BulkImporter, normalize, parse_timestamp
+from retention import archive_inactive
+
+NOW = '2026-10-19 12:00:00'
+
+
+def record(**fields):
+    base = {'portal': 'otodom', 'url': 'https://www.otodom.pl/pl/oferta/test', 'price': 500000, 'area': 50}
+    base.update(fields)
+    return base
+
+
+class ParseTimestampTest(unittest.TestCase):
+    def test_epoch_seconds_and_milliseconds(self):
+        expected = datetime.fromtimestamp(1792000000).strftime('%Y-%m-%d %H:%M:%S')
+        self.assertEqual(parse_timestamp(1792000000), expected)
+        self.assertEqual(parse_timestamp('1792000000'), expected)
+        self.assertEqual(parse_timestamp(1792000000000), expected)
+
+    def test_iso_8601(self):
+        utc = datetime(2026, 1, 5, 10, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_timestamp('2026-01-05T10:00:00Z'),
+                         utc.astimezone().strftime('%Y-%m-%d %H:%M:%S'))
+        self.assertEqual(parse_timestamp('2026-01-05T10:00:00'), '2026-01-05 10:00:00')
+        self.assertEqual(parse_timestamp('2026-01-05'), '2026-01-05 00:00:00')
+
+    def test_csv_export_format(self):
+        self.assertEqual(parse_timestamp('2026-01-05 10:00:00'), '2026-01-05 10:00:00')
+        self.assertEqual(parse_timestamp('05.01.2026 10:00'), '2026-01-05 10:00:00')
+
+    def test_unparseable(self):
+        for value in ('wczoraj', '', 'nan', True, 350000):
+            self.assertIsNone(parse_timestamp(value), value)
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_timestamps_are_normalized(self):
+        row = normalize(record(first_seen='2026-01-05T10:00:00', last_seen=1792000000), NOW)
+        self.assertEqual(row[7], '2026-01-05 10:00:00')
+        self.assertEqual(row[8], datetime.fromtimestamp(1792000000).strftime('%Y-%m-%d %H:%M:%S'))
+
+    def test_missing_timestamps_fall_back_to_now(self):
+        row = normalize(record(), NOW)
+        self.assertEqual((row[7], row[8]), (NOW, NOW))
+
+    def test_unparseable_timestamp_rejects_record(self):
+        self.assertIsNone(normalize(record(last_seen='wczoraj'), NOW))
+
+
+class ImportTest(unittest.TestCase):
+    def test_recent_epoch_is_not_archived(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'properties.db')
+            with sqlite3.connect(db_path) as conn:
+                conn.execute('''CREATE TABLE properties (
+                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    portal TEXT, title TEXT, price REAL, area REAL,
+                                    price_per_m2 REAL, location TEXT, url TEXT UNIQUE,
+                                    first_seen TEXT, last_seen TEXT, is_active INTEGER DEFAULT 1,
+                                    score REAL, lat REAL, lon REAL)''')
+                geo.init_db(conn)
+            dump = os.path.join(tmp, 'dump.jsonl')
+            with open(dump, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(record(last_seen=int(time.time()) - 86400)) + '\n')
+                f.write(json.dumps(record(url='https://www.otodom.pl/pl/oferta/iso',
+                                          last_seen='2026-01-05T10:00:00Z')) + '\n')
+
+            importer = BulkImporter(db_path)
+            importer.run([dump])
+            importer.conn.close()
+
+            archive_dir = os.path.join(tmp, 'archive')
+            archive_inactive(db_path, archive_dir, 90)
+            with sqlite3.connect(db_path) as conn:
+                urls = [r[0] for r in conn.execute('SELECT url FROM properties')]
+            self.assertEqual(urls, ['https://www.otodom.pl/pl/oferta/test'])
+            self.assertTrue(all(name[len('properties_'):][4] == '-' for name in os.listdir(archive_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
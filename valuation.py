@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Wycena ofert względem rynku: strumieniowe statystyki ceny za m² w segmentach
+(portal, lokalizacja, przedział metrażu) i odporny z-score dla każdej nowej oferty
+"""
+
+import json
+import sqlite3
+from typing import Dict, List, Optional
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+WINDOW = 1000        # po tylu obserwacjach segment zaczyna nowy szkic (okno kroczące)
+MIN_SAMPLES = 20     # poniżej tej liczby obserwacji segment nie wycenia
+MAD_SCALE = 1.4826   # MAD * 1.4826 ~ odchylenie standardowe dla rozkładu normalnego
+AREA_BUCKETS = ((0, 35, '<35'), (35, 50, '35-50'), (50, 70, '50-70'), (70, 90, '70-90'), (90, float('inf'), '90+'))
+
+
+class P2Quantile:
+    """Estymator kwantyla P² (Jain, Chlamtac) - 5 znaczników, O(1) pamięci i czasu"""
+
+    __slots__ = ('p', 'q', 'n', 'np', 'dn')
+
+    def __init__(self, p: float):
+        self.p = p
+        self.q: List[float] = []
+        self.n = [1, 2, 3, 4, 5]
+        self.np = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        if not self.q:
+            return None
+        if len(self.q) < 5:
+            return self.q[round(self.p * (len(self.q) - 1))]
+        return self.q[2]
+
+    def to_dict(self) -> Dict:
+        return {'p': self.p, 'q': self.q, 'n': self.n, 'np': self.np}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'P2Quantile':
+        est = cls(d['p'])
+        est.q, est.n, est.np = d['q'], d['n'], d['np']
+        return est
+
+
+class Sketch:
+    """Kwantyle ceny za m² oraz MAD (mediana odchyleń od bieżącej mediany)"""
+
+    __slots__ = ('count', 'quantiles', 'mad')
+
+    def __init__(self):
+        self.count = 0
+        self.quantiles = {p: P2Quantile(p) for p in QUANTILES}
+        self.mad = P2Quantile(0.5)
+
+    @property
+    def median(self) -> Optional[float]:
+        return self.quantiles[0.5].value()
+
+    def add(self, x: float):
+        median = self.median
+        for est in self.quantiles.values():
+            est.add(x)
+        if median is not None:
+            self.mad.add(abs(x - median))
+        self.count += 1
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'mad': self.mad.to_dict(),
+                'quantiles': [est.to_dict() for est in self.quantiles.values()]}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'Sketch':
+        sketch = cls()
+        sketch.count = d['count']
+        sketch.mad = P2Quantile.from_dict(d['mad'])
+        for q in d['quantiles']:
+            sketch.quantiles[q['p']] = P2Quantile.from_dict(q)
+        return sketch
+
+
+class SegmentStats:
+    """
+    Okno kroczące z dwóch szkiców: po WINDOW obserwacjach bieżący staje się
+    poprzednim, a statystyki liczone są od nowa - stare ceny przestają ważyć.
+    """
+
+    __slots__ = ('current', 'previous')
+
+    def __init__(self):
+        self.current = Sketch()
+        self.previous: Optional[Sketch] = None
+
+    def add(self, x: float):
+        self.current.add(x)
+        if self.current.count >= WINDOW:
+            self.previous, self.current = self.current, Sketch()
+
+    def active(self) -> Optional[Sketch]:
+        # Świeży szkic zastępuje poprzedni, gdy zbierze ćwierć okna
+        if self.previous is None or self.current.count >= WINDOW // 4:
+            return self.current if self.current.count >= MIN_SAMPLES else None
+        return self.previous
+
+    def to_dict(self) -> Dict:
+        return {'current': self.current.to_dict(),
+                'previous': self.previous.to_dict() if self.previous else None}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'SegmentStats':
+        stats = cls()
+        stats.current = Sketch.from_dict(d['current'])
+        stats.previous = Sketch.from_dict(d['previous']) if d['previous'] else None
+        return stats
+
+
+def area_bucket(area: float) -> str:
+    for low, high, label in AREA_BUCKETS:
+        if low <= area < high:
+            return label
+    return AREA_BUCKETS[-1][2]
+
+
+class Valuator:
+    """
+    Wycenia oferty w O(1) względem ich segmentu. Gdy segment ma za mało danych,
+    sięga do szerszego: (portal, lokalizacja, metraż) -> (*, lokalizacja, metraż)
+    -> (*, *, metraż). Stan zapisywany w tabeli segment_stats.
+    """
+
+    def __init__(self, threshold: float = -1.5):
+        self.threshold = threshold
+        self.segments: Dict[str, SegmentStats] = {}
+        self._dirty = set()
+
+    @staticmethod
+    def segment_keys(portal: str, location: str, area: float) -> List[str]:
+        bucket = area_bucket(area)
+        return [f"{portal}|{location}|{bucket}", f"*|{location}|{bucket}", f"*|*|{bucket}"]
+
+    def score(self, portal: str, location: str, area: float, price_per_m2: float) -> Optional[float]:
+        """Odporny z-score: ujemny = taniej niż typowo w segmencie. None - brak danych."""
+        if area <= 0 or price_per_m2 <= 0:
+            return None
+        for key in self.segment_keys(portal, location, area):
+            stats = self.segments.get(key)
+            sketch = stats.active() if stats else None
+            if sketch is None:
+                continue
+            mad = sketch.mad.value()
+            if not mad:
+                continue
+            return round((price_per_m2 - sketch.median) / (MAD_SCALE * mad), 2)
+        return None
+
+    def observe(self, portal: str, location: str, area: float, price_per_m2: float):
+        if area <= 0 or price_per_m2 <= 0:
+            return
+        for key in self.segment_keys(portal, location, area):
+            self.segments.setdefault(key, SegmentStats()).add(price_per_m2)
+            self._dirty.add(key)
+
+    def is_bargain(self, score: Optional[float]) -> bool:
+        return score is not None and score <= self.threshold
+
+    @staticmethod
+    def init_db(conn: sqlite3.Connection):
+        conn.execute('CREATE TABLE IF NOT EXISTS segment_stats (segment TEXT PRIMARY KEY, state TEXT)')
+
+    def load(self, conn: sqlite3.Connection):
+        for segment, state in conn.execute('SELECT segment, state FROM segment_stats'):
+            self.segments[segment] = SegmentStats.from_dict(json.loads(state))
+
+    def save(self, conn: sqlite3.Connection):
+        """Zapisuje tylko segmenty zmienione od ostatniego zapisu"""
+        conn.executemany('INSERT OR REPLACE INTO segment_stats (segment, state) VALUES (?, ?)',
+                         [(key, json.dumps(self.segments[key].to_dict())) for key in self._dirty])
+        self._dirty.clear()
+
+
+def rebuild(db_path: str) -> int:
+    """
+    Jednorazowe przeliczenie statystyk i ocen z całej bazy (np. po wdrożeniu).
+    Monitor musi być zatrzymany - trzyma własny Valuator w pamięci i przy zapisie
+    kolejnej paczki nadpisałby przeliczone segmenty swoimi.
+    """
+    valuator = Valuator()
+    with sqlite3.connect(db_path) as conn:
+        Valuator.init_db(conn)
+        conn.execute('DELETE FROM segment_stats')
+        rows = conn.execute('''SELECT id, portal, location, area, price_per_m2 FROM properties
+                               ORDER BY first_seen''')
+        count, scores = 0, []
+        for prop_id, portal, location, area, ppm2 in rows:
+            scores.append((valuator.score(portal, location, area, ppm2), prop_id))
+            valuator.observe(portal, location, area, ppm2)
+            count += 1
+            if len(scores) >= 5000:
+                conn.executemany('UPDATE properties SET score = ? WHERE id = ?', scores)
+                scores = []
+        conn.executemany('UPDATE properties SET score = ? WHERE id = ?', scores)
+        valuator.save(conn)
+    return count
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild':
+        count = rebuild('properties.db')
+        print(f"✓ Przeliczono statystyki segmentów dla {count} ofert")
+    else:
+        print("Użycie: python valuation.py --rebuild")